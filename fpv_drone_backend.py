@@ -5,14 +5,21 @@ import asyncio
 import json
 import time
 import math
+import os
 import sqlite3
 import logging
-from datetime import datetime, timedelta
+import logging.handlers
+import atexit
+import csv
+import io
+import zipfile
+from datetime import datetime, timedelta, timezone
 from typing import Dict, List, Optional, Tuple
 from dataclasses import dataclass, asdict
 from enum import Enum
+from collections import OrderedDict
 import threading
-from queue import Queue, Empty
+from queue import Queue, Empty, Full
 
 # WebSocket and HTTP server
 import websockets
@@ -36,6 +43,14 @@ except ImportError:
     print("Geopy not available. Install with: pip install geopy")
     GEOPY_AVAILABLE = False
 
+# Spatial aggregation for heatmap tiles
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    print("NumPy not available, heatmap tiles disabled. Install with: pip install numpy")
+    NUMPY_AVAILABLE = False
+
 # Load configuration from file or use defaults
 def load_config():
     """Load configuration from config.json or use defaults"""
@@ -43,7 +58,8 @@ def load_config():
         'server': {
             'host': '0.0.0.0',
             'port': 8080,
-            'websocket_port': 8081
+            'websocket_port': 8081,
+            'long_poll_timeout': 30  # seconds, upper bound for ?since= requests
         },
         'drone': {
             'connection_string': 'udp:127.0.0.1:14550',  # Default SITL connection
@@ -55,7 +71,14 @@ def load_config():
         },
         'logging': {
             'level': 'INFO',
-            'file': 'drone_backend.log'
+            'file': 'drone_backend.log',
+            'max_bytes': 10 * 1024 * 1024,
+            'backup_count': 5,
+            'rotate_interval': 86400,  # seconds, 0 disables time-based rotation
+            'queue_size': 10000,
+            'flight_log_queue_size': 10000,
+            'flight_log_batch_size': 100,
+            'flight_log_flush_interval': 1.0  # seconds
         },
         'simulation': {
             'enabled': True,
@@ -63,6 +86,16 @@ def load_config():
             'center_lon': -73.9851,
             'flight_radius': 0.001,
             'max_altitude': 100
+        },
+        'heatmap': {
+            'cell_zoom': 20,  # slippy-map zoom of the stored aggregation cells
+            'tile_bins': 32,  # bins per tile side, power of two
+            'cache_size': 256,  # encoded tiles kept in the LRU cache
+            'chunk_size': 50000  # telemetry rows binned per pass
+        },
+        'export': {
+            'chunk_size': 1000,  # telemetry rows encoded per streamed chunk
+            'max_sessions': 100  # sessions allowed in one zip export
         }
     }
     
@@ -88,14 +121,72 @@ def load_config():
 CONFIG = load_config()
 
 # Setup logging
-logging.basicConfig(
-    level=getattr(logging, CONFIG['logging']['level']),
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(CONFIG['logging']['file']),
-        logging.StreamHandler()
-    ]
-)
+class RotatingLogFileHandler(logging.handlers.RotatingFileHandler):
+    """File handler that rotates on size or after a fixed interval, whichever comes first"""
+
+    def __init__(self, filename: str, max_bytes: int = 0, backup_count: int = 0,
+                 rotate_interval: float = 0):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, delay=True)
+        self.rotate_interval = rotate_interval
+        self.rollover_at = None
+        if rotate_interval:
+            # Like TimedRotatingFileHandler, count from the existing file so restarts don't reset it
+            if os.path.exists(self.baseFilename):
+                start = os.stat(self.baseFilename).st_mtime
+            else:
+                start = time.time()
+            self.rollover_at = start + rotate_interval
+
+    def shouldRollover(self, record):
+        if self.rollover_at is not None and time.time() >= self.rollover_at:
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        super().doRollover()
+        if self.rotate_interval:
+            self.rollover_at = time.time() + self.rotate_interval
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that never blocks the caller and counts records dropped on overload"""
+
+    def __init__(self, queue: Queue):
+        super().__init__(queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except Full:
+            self.dropped += 1
+
+def setup_logging():
+    """Route log records through an in-memory queue drained by a background thread"""
+    log_config = CONFIG['logging']
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    
+    file_handler = RotatingLogFileHandler(
+        log_config['file'],
+        max_bytes=log_config['max_bytes'],
+        backup_count=log_config['backup_count'],
+        rotate_interval=log_config['rotate_interval']
+    )
+    stream_handler = logging.StreamHandler()
+    for handler in (file_handler, stream_handler):
+        handler.setFormatter(formatter)
+    
+    # The queue handler must stay unformatted, otherwise the listener formats twice
+    queue_handler = DroppingQueueHandler(Queue(maxsize=log_config['queue_size']))
+    root_logger = logging.getLogger()
+    root_logger.setLevel(getattr(logging, log_config['level']))
+    root_logger.addHandler(queue_handler)
+    
+    listener = logging.handlers.QueueListener(queue_handler.queue, file_handler, stream_handler)
+    listener.start()
+    atexit.register(listener.stop)
+    return queue_handler, listener
+
+log_queue_handler, log_listener = setup_logging()
 logger = logging.getLogger(__name__)
 
 # Data models
@@ -161,9 +252,27 @@ class TelemetryData:
     rssi: int = 0
 
 class DatabaseManager:
-    def __init__(self, db_path: str):
+    # Telemetry columns that may be selected for export
+    TELEMETRY_FIELDS = [
+        'timestamp', 'latitude', 'longitude', 'altitude', 'roll', 'pitch', 'yaw',
+        'groundspeed', 'battery_voltage', 'battery_remaining', 'flight_mode', 'armed'
+    ]
+    
+    def __init__(self, db_path: str, flight_log_batch_size: int = 100,
+                 flight_log_flush_interval: float = 1.0, flight_log_queue_size: int = 10000):
         self.db_path = db_path
         self.init_database()
+        
+        # Flight log messages are batched into flight_logs by a writer thread
+        self.flight_log_batch_size = flight_log_batch_size
+        self.flight_log_flush_interval = flight_log_flush_interval
+        self.flight_log_queue = Queue(maxsize=flight_log_queue_size)
+        self.dropped_flight_logs = 0
+        self._flight_log_thread = threading.Thread(
+            target=self._flight_log_writer, name='flight-log-writer', daemon=True
+        )
+        self._flight_log_thread.start()
+        atexit.register(self.close)
     
     def init_database(self):
         """Initialize database tables"""
@@ -218,6 +327,11 @@ class DatabaseManager:
             )
         ''')
         
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_telemetry_session
+            ON telemetry (session_id, timestamp)
+        ''')
+        
         # Flight logs table
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS flight_logs (
@@ -287,16 +401,104 @@ class DatabaseManager:
         conn.close()
     
     def log_message(self, session_id: int, level: str, message: str):
-        """Log a flight message"""
+        """Queue a flight message for the batched flight_logs writer"""
+        try:
+            self.flight_log_queue.put_nowait((session_id, time.time(), level, message))
+        except Full:
+            self.dropped_flight_logs += 1
+    
+    def _flight_log_writer(self):
+        """Drain queued flight messages into flight_logs in batches"""
         conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO flight_logs (session_id, timestamp, level, message)
-            VALUES (?, ?, ?, ?)
-        ''', (session_id, time.time(), level, message))
-        conn.commit()
+        batch = []
+        deadline = time.monotonic() + self.flight_log_flush_interval
+        running = True
+        
+        while running:
+            try:
+                entry = self.flight_log_queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                if entry is None:
+                    running = False
+                else:
+                    batch.append(entry)
+            except Empty:
+                pass
+            
+            now = time.monotonic()
+            if batch and (not running or len(batch) >= self.flight_log_batch_size or now >= deadline):
+                self._write_flight_logs(conn, batch)
+                batch = []
+            if now >= deadline:
+                deadline = now + self.flight_log_flush_interval
+        
         conn.close()
+    
+    def _write_flight_logs(self, conn: sqlite3.Connection, batch: List[Tuple]):
+        """Insert a batch of flight messages in a single transaction"""
+        try:
+            conn.executemany('''
+                INSERT INTO flight_logs (session_id, timestamp, level, message)
+                VALUES (?, ?, ?, ?)
+            ''', batch)
+            conn.commit()
+        except sqlite3.Error as e:
+            self.dropped_flight_logs += len(batch)
+            logger.error(f"Error writing flight logs: {e}")
+    
+    def close(self):
+        """Flush pending flight messages and stop the writer thread"""
+        if self._flight_log_thread.is_alive():
+            self.flight_log_queue.put(None)
+            self._flight_log_thread.join(timeout=5)
 
+    def session_exists(self, session_id: int) -> bool:
+        """Check whether a flight session exists"""
+        conn = sqlite3.connect(self.db_path)
+        row = conn.execute('''
+            SELECT 1 FROM flight_sessions WHERE id = ?
+        ''', (session_id,)).fetchone()
+        conn.close()
+        return row is not None
+    
+    def missing_sessions(self, session_ids: List[int]) -> List[int]:
+        """Return the ids that have no flight session"""
+        conn = sqlite3.connect(self.db_path)
+        placeholders = ', '.join('?' * len(session_ids))
+        found = {row[0] for row in conn.execute(f'''
+            SELECT id FROM flight_sessions WHERE id IN ({placeholders})
+        ''', session_ids)}
+        conn.close()
+        return [session_id for session_id in session_ids if session_id not in found]
+    
+    def iter_telemetry(self, session_id: int, fields: List[str], start: Optional[float] = None,
+                       end: Optional[float] = None, chunk_size: int = 1000):
+        """Yield a session's telemetry rows in timestamp order, chunk_size rows at a time"""
+        unknown = [field for field in fields if field not in self.TELEMETRY_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown telemetry fields: {', '.join(unknown)}")
+        
+        query = f"SELECT {', '.join(fields)} FROM telemetry WHERE session_id = ?"
+        params = [session_id]
+        if start is not None:
+            query += " AND timestamp >= ?"
+            params.append(start)
+        if end is not None:
+            query += " AND timestamp <= ?"
+            params.append(end)
+        query += " ORDER BY timestamp"
+        
+        # Chunks are pulled from executor threads, one at a time
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        try:
+            cursor = conn.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            conn.close()
+    
     def get_flight_history(self, limit: int = 50):
         """Get flight history"""
         conn = sqlite3.connect(self.db_path)
@@ -327,9 +529,254 @@ class DatabaseManager:
         conn.close()
         return sessions
 
+class HeatmapAggregator:
+    """Aggregate historical telemetry positions into slippy-map heatmap tiles
+    
+    Positions are binned into cells at `cell_zoom` (count, altitude sum and
+    count, minimum battery) stored in heatmap_cells. Tiles at lower zooms are
+    rebinned from those cells on request and kept in an LRU cache.
+    """
+    MAX_LATITUDE = 85.05112878
+    
+    def __init__(self, db_path: str, cell_zoom: int = 20, tile_bins: int = 32,
+                 cache_size: int = 256, chunk_size: int = 50000):
+        self.db_path = db_path
+        self.cell_zoom = cell_zoom
+        self.tile_bits = max(0, tile_bins.bit_length() - 1)
+        self.cache_size = cache_size
+        self.chunk_size = chunk_size
+        self.version = 0
+        self._epoch = int(time.time())
+        self._tile_cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.init_tables()
+    
+    def init_tables(self):
+        """Initialize heatmap tables"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS heatmap_cells (
+                zoom INTEGER,
+                cx INTEGER,
+                cy INTEGER,
+                count INTEGER,
+                altitude_count INTEGER,
+                altitude_sum REAL,
+                min_battery REAL,
+                PRIMARY KEY (zoom, cx, cy)
+            ) WITHOUT ROWID
+        ''')
+        
+        # Sessions already folded into heatmap_cells
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS heatmap_sessions (
+                zoom INTEGER,
+                session_id INTEGER,
+                PRIMARY KEY (zoom, session_id)
+            ) WITHOUT ROWID
+        ''')
+        
+        conn.commit()
+        conn.close()
+    
+    def _cell_coords(self, latitude, longitude):
+        """Convert position arrays to cell coordinates at cell_zoom"""
+        n = 1 << self.cell_zoom
+        lat_rad = np.radians(np.clip(latitude, -self.MAX_LATITUDE, self.MAX_LATITUDE))
+        cx = np.floor((longitude + 180.0) / 360.0 * n)
+        cy = np.floor((1.0 - np.log(np.tan(lat_rad) + 1.0 / np.cos(lat_rad)) / math.pi) / 2.0 * n)
+        return (np.clip(cx, 0, n - 1).astype(np.int64),
+                np.clip(cy, 0, n - 1).astype(np.int64))
+    
+    @staticmethod
+    def _reduce_cells(keys, counts, altitude_counts, altitude_sums, min_battery):
+        """Combine per-cell aggregate arrays that share a cell key"""
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        return (
+            keys[starts],
+            np.add.reduceat(counts[order], starts),
+            np.add.reduceat(altitude_counts[order], starts),
+            np.add.reduceat(altitude_sums[order], starts),
+            np.fmin.reduceat(min_battery[order], starts)
+        )
+    
+    def _bin_rows(self, rows: List[Tuple]):
+        """Reduce (latitude, longitude, altitude, battery) rows to per-cell aggregate arrays"""
+        data = np.array(rows, dtype=float)
+        cx, cy = self._cell_coords(data[:, 0], data[:, 1])
+        keys = (cx << self.cell_zoom) | cy
+        
+        # NULL altitudes are left out of both the sum and its count
+        altitudes = data[:, 2]
+        has_altitude = ~np.isnan(altitudes)
+        return self._reduce_cells(
+            keys,
+            np.ones(len(keys), dtype=np.int64),
+            has_altitude.astype(np.int64),
+            np.where(has_altitude, altitudes, 0.0),
+            data[:, 3]
+        )
+    
+    def aggregate_session(self, conn: sqlite3.Connection, session_id: int) -> int:
+        """Fold one session's telemetry into heatmap_cells, returns rows binned"""
+        cursor = conn.execute('''
+            SELECT latitude, longitude, altitude, battery_remaining
+            FROM telemetry
+            WHERE session_id = ? AND latitude IS NOT NULL AND longitude IS NOT NULL
+                AND NOT (latitude = 0 AND longitude = 0)
+        ''', (session_id,))
+        
+        # Bin every chunk in memory first, bounded by cells rather than rows,
+        # so the write transaction below stays short
+        cells = None
+        total = 0
+        while True:
+            rows = cursor.fetchmany(self.chunk_size)
+            if not rows:
+                break
+            binned = self._bin_rows(rows)
+            if cells is not None:
+                binned = self._reduce_cells(*(np.concatenate(pair) for pair in zip(cells, binned)))
+            cells = binned
+            total += len(rows)
+        
+        if cells is not None:
+            mask = (1 << self.cell_zoom) - 1
+            conn.executemany('''
+                INSERT INTO heatmap_cells (
+                    zoom, cx, cy, count, altitude_count, altitude_sum, min_battery
+                ) VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (zoom, cx, cy) DO UPDATE SET
+                    count = count + excluded.count,
+                    altitude_count = altitude_count + excluded.altitude_count,
+                    altitude_sum = altitude_sum + excluded.altitude_sum,
+                    min_battery = COALESCE(MIN(min_battery, excluded.min_battery),
+                                           min_battery, excluded.min_battery)
+            ''', [
+                (self.cell_zoom, int(key >> self.cell_zoom), int(key & mask), int(count),
+                 int(altitude_count), float(altitude_sum),
+                 None if math.isnan(battery) else float(battery))
+                for key, count, altitude_count, altitude_sum, battery in zip(*cells)
+            ])
+        
+        conn.execute('''
+            INSERT INTO heatmap_sessions (zoom, session_id) VALUES (?, ?)
+        ''', (self.cell_zoom, session_id))
+        return total
+    
+    def aggregate_pending_sessions(self) -> int:
+        """Fold every ended session not yet in the heatmap, returns sessions added"""
+        with self._lock:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                session_ids = [row[0] for row in conn.execute('''
+                    SELECT id FROM flight_sessions
+                    WHERE end_time IS NOT NULL AND id NOT IN (
+                        SELECT session_id FROM heatmap_sessions WHERE zoom = ?
+                    )
+                    ORDER BY id
+                ''', (self.cell_zoom,))]
+                
+                for session_id in session_ids:
+                    rows = self.aggregate_session(conn, session_id)
+                    conn.commit()
+                    logger.info(f"Added session {session_id} to heatmap ({rows} positions)")
+            finally:
+                conn.close()
+        return len(session_ids)
+    
+    def render_tile(self, z: int, x: int, y: int) -> bytes:
+        """Rebin the cells under tile z/x/y into a sparse JSON grid"""
+        shift = self.cell_zoom - z
+        bits = min(shift, self.tile_bits)
+        size = 1 << bits
+        cell_shift = shift - bits
+        x0, y0 = x << shift, y << shift
+        
+        conn = sqlite3.connect(self.db_path)
+        rows = conn.execute('''
+            SELECT cx, cy, count, altitude_count, altitude_sum, min_battery
+            FROM heatmap_cells
+            WHERE zoom = ? AND cx BETWEEN ? AND ? AND cy BETWEEN ? AND ?
+        ''', (self.cell_zoom, x0, x0 + (1 << shift) - 1, y0, y0 + (1 << shift) - 1)).fetchall()
+        conn.close()
+        
+        cells = []
+        if rows:
+            data = np.array(rows, dtype=float)
+            bx = (data[:, 0].astype(np.int64) - x0) >> cell_shift
+            by = (data[:, 1].astype(np.int64) - y0) >> cell_shift
+            index = by * size + bx
+            
+            counts = np.bincount(index, weights=data[:, 2], minlength=size * size)
+            altitude_counts = np.bincount(index, weights=data[:, 3], minlength=size * size)
+            altitude_sums = np.bincount(index, weights=data[:, 4], minlength=size * size)
+            min_battery = np.full(size * size, np.nan)
+            np.fmin.at(min_battery, index, data[:, 5])
+            
+            for i in np.flatnonzero(counts):
+                battery = min_battery[i]
+                cells.append([
+                    int(i % size), int(i // size), int(counts[i]),
+                    round(float(altitude_sums[i] / altitude_counts[i]), 2) if altitude_counts[i] else None,
+                    None if math.isnan(battery) else float(battery)
+                ])
+        
+        return json.dumps({
+            'z': z, 'x': x, 'y': y,
+            'size': size,
+            'fields': ['bx', 'by', 'count', 'mean_altitude', 'min_battery'],
+            'cells': cells
+        }).encode('utf-8')
+    
+    def invalidate(self):
+        """Drop cached tiles after new sessions were aggregated"""
+        self.version += 1
+        self._tile_cache.clear()
+    
+    async def update(self):
+        """Aggregate newly ended sessions without blocking the event loop"""
+        loop = asyncio.get_running_loop()
+        try:
+            added = await loop.run_in_executor(None, self.aggregate_pending_sessions)
+        except sqlite3.Error as e:
+            logger.error(f"Error updating heatmap: {e}")
+            return
+        if added:
+            self.invalidate()
+    
+    async def get_tile(self, z: int, x: int, y: int) -> Tuple[str, bytes]:
+        """Return (etag, body) for a tile, rendering it only on a cache miss"""
+        key = (z, x, y)
+        cached = self._tile_cache.get(key)
+        if cached is not None:
+            self._tile_cache.move_to_end(key)
+            return cached
+        
+        version = self.version
+        loop = asyncio.get_running_loop()
+        body = await loop.run_in_executor(None, self.render_tile, z, x, y)
+        tile = (f'"{self._epoch}-heatmap-{version}"', body)
+        
+        # Sessions may have been aggregated while the tile rendered
+        if version == self.version:
+            self._tile_cache[key] = tile
+            if len(self._tile_cache) > self.cache_size:
+                self._tile_cache.popitem(last=False)
+        return tile
+
 class DroneController:
     def __init__(self):
-        self.db = DatabaseManager(CONFIG['database']['path'])
+        self.db = DatabaseManager(
+            CONFIG['database']['path'],
+            flight_log_batch_size=CONFIG['logging']['flight_log_batch_size'],
+            flight_log_flush_interval=CONFIG['logging']['flight_log_flush_interval'],
+            flight_log_queue_size=CONFIG['logging']['flight_log_queue_size']
+        )
         self.status = DroneStatus.DISCONNECTED
         self.current_session_id = None
         self.flight_stats = {
@@ -354,12 +801,38 @@ class DroneController:
         # WebSocket clients
         self.websocket_clients = set()
         
+        # Sequence-numbered telemetry frames shared by all HTTP pollers
+        self.telemetry_seq = 0
+        self._frame_epoch = int(time.time())
+        self._telemetry_frame = None
+        self._telemetry_changed = asyncio.Event()
+        
+        # Heatmap tiles built from historical telemetry
+        if NUMPY_AVAILABLE:
+            self.heatmap = HeatmapAggregator(
+                CONFIG['database']['path'],
+                cell_zoom=CONFIG['heatmap']['cell_zoom'],
+                tile_bins=CONFIG['heatmap']['tile_bins'],
+                cache_size=CONFIG['heatmap']['cache_size'],
+                chunk_size=CONFIG['heatmap']['chunk_size']
+            )
+        else:
+            self.heatmap = None
+        
+        # Encoded flight history, invalidated when a session starts or ends
+        self._flight_history_version = 0
+        self._flight_history_cache = None
+        
     async def start(self):
         """Start the drone controller"""
         logger.info("Starting drone controller...")
         
         # Start telemetry simulation
         asyncio.create_task(self._simulate_telemetry())
+        
+        # Pick up sessions that ended before the heatmap was last updated
+        if self.heatmap:
+            asyncio.create_task(self.heatmap.update())
     
     async def _simulate_telemetry(self):
         """Simulate telemetry data when no real drone is connected"""
@@ -396,6 +869,7 @@ class DroneController:
                 self.current_telemetry.heading = (elapsed * 20) % 360
                 
                 self.current_telemetry.timestamp = current_time
+                self._advance_telemetry_frame()
                 
                 # Broadcast to clients
                 await self._broadcast_telemetry()
@@ -406,6 +880,62 @@ class DroneController:
                 logger.error(f"Error in telemetry simulation: {e}")
                 await asyncio.sleep(1)
     
+    def _advance_telemetry_frame(self):
+        """Start a new telemetry frame and wake long-polling clients"""
+        self.telemetry_seq += 1
+        self._telemetry_frame = None
+        self._telemetry_changed.set()
+        self._telemetry_changed = asyncio.Event()
+    
+    def get_telemetry_frame(self) -> Tuple[int, str, bytes]:
+        """Return (seq, etag, body) for the current frame, encoding it once per frame"""
+        if self._telemetry_frame is None:
+            body = json.dumps({
+                'seq': self.telemetry_seq,
+                'telemetry': asdict(self.current_telemetry),
+                'status': self.status.value,
+                'session_id': self.current_session_id
+            }).encode('utf-8')
+            etag = f'"{self._frame_epoch}-{self.telemetry_seq}"'
+            self._telemetry_frame = (self.telemetry_seq, etag, body)
+        return self._telemetry_frame
+    
+    async def wait_for_telemetry(self, since: int, timeout: float) -> bool:
+        """Wait until a frame newer than `since` exists, returns False on timeout"""
+        # A client ahead of the counter saw a previous run, so it is already stale
+        if since > self.telemetry_seq:
+            return True
+        
+        deadline = time.monotonic() + timeout
+        while self.telemetry_seq <= since:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            try:
+                await asyncio.wait_for(self._telemetry_changed.wait(), remaining)
+            except asyncio.TimeoutError:
+                return False
+        return True
+    
+    def invalidate_flight_history(self):
+        """Drop the cached flight history after sessions change"""
+        self._flight_history_version += 1
+        self._flight_history_cache = None
+    
+    async def get_flight_history(self) -> Tuple[str, bytes]:
+        """Return (etag, body) for the flight history, querying SQLite only on a cache miss"""
+        if self._flight_history_cache is None:
+            version = self._flight_history_version
+            loop = asyncio.get_running_loop()
+            sessions = await loop.run_in_executor(None, self.db.get_flight_history)
+            body = json.dumps({'flights': sessions}).encode('utf-8')
+            etag = f'"{self._frame_epoch}-flights-{version}"'
+            # A session may have started or ended while the query ran
+            if version != self._flight_history_version:
+                return etag, body
+            self._flight_history_cache = (etag, body)
+        return self._flight_history_cache
+    
     async def _broadcast_telemetry(self):
         """Broadcast telemetry to all WebSocket clients"""
         if not self.websocket_clients:
@@ -467,6 +997,7 @@ class DroneController:
             
             elif command == 'start_session':
                 self.current_session_id = self.db.start_flight_session()
+                self.invalidate_flight_history()
                 self.flight_stats['start_time'] = time.time()
                 self.flight_stats['battery_start'] = self.current_telemetry.battery.remaining
                 return {'success': True, 'session_id': self.current_session_id}
@@ -487,6 +1018,9 @@ class DroneController:
                     
                     self.db.end_flight_session(self.current_session_id, stats)
                     self.current_session_id = None
+                    self.invalidate_flight_history()
+                    if self.heatmap:
+                        asyncio.create_task(self.heatmap.update())
                     return {'success': True, 'stats': stats}
                 else:
                     return {'success': False, 'message': 'No active session'}
@@ -497,6 +1031,10 @@ class DroneController:
         except Exception as e:
             logger.error(f"Error handling command {command}: {e}")
             return {'success': False, 'message': str(e)}
+        
+        finally:
+            # Status and session changes must be visible to conditional GETs
+            self._advance_telemetry_frame()
 
 # WebSocket handler
 async def websocket_handler(websocket, path, drone_controller):
@@ -531,17 +1069,168 @@ async def websocket_handler(websocket, path, drone_controller):
     finally:
         drone_controller.websocket_clients.discard(websocket)
 
+# Session export
+TRACK_FIELDS = ['timestamp', 'latitude', 'longitude', 'altitude']
+
+def _iso_time(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+
+def _gpx_point(timestamp: Optional[float], lat: float, lon: float, alt: Optional[float]) -> str:
+    # Missing readings are omitted rather than written as zero
+    ele = f'<ele>{alt:.2f}</ele>' if alt is not None else ''
+    when = f'<time>{_iso_time(timestamp)}</time>' if timestamp is not None else ''
+    return f'<trkpt lat="{lat:.7f}" lon="{lon:.7f}">{ele}{when}</trkpt>\n'
+
+def export_csv(session_id: int, fields: List[str], row_chunks):
+    """Encode telemetry row chunks as CSV"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    yield buffer.getvalue()
+    
+    for rows in row_chunks:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows)
+        yield buffer.getvalue()
+
+def export_ndjson(session_id: int, fields: List[str], row_chunks):
+    """Encode telemetry row chunks as newline-delimited JSON"""
+    for rows in row_chunks:
+        yield ''.join(json.dumps(dict(zip(fields, row))) + '\n' for row in rows)
+
+def export_gpx(session_id: int, fields: List[str], row_chunks):
+    """Encode telemetry row chunks as a GPX track"""
+    yield ('<?xml version="1.0" encoding="UTF-8"?>\n'
+           '<gpx version="1.1" creator="FPV Drone Tracker" xmlns="http://www.topografix.com/GPX/1/1">\n'
+           f'<trk><name>Flight session {session_id}</name><trkseg>\n')
+    
+    for rows in row_chunks:
+        yield ''.join(
+            _gpx_point(timestamp, lat, lon, alt)
+            for timestamp, lat, lon, alt in rows
+            if lat is not None and lon is not None
+        )
+    
+    yield '</trkseg></trk>\n</gpx>\n'
+
+def export_kml(session_id: int, fields: List[str], row_chunks):
+    """Encode telemetry row chunks as a KML line string"""
+    yield ('<?xml version="1.0" encoding="UTF-8"?>\n'
+           '<kml xmlns="http://www.opengis.net/kml/2.2"><Document>\n'
+           f'<name>Flight session {session_id}</name>\n'
+           f'<Placemark><name>Flight session {session_id}</name>\n'
+           '<LineString><altitudeMode>absolute</altitudeMode><coordinates>\n')
+    
+    for rows in row_chunks:
+        yield ''.join(
+            (f'{lon:.7f},{lat:.7f},{alt:.2f}\n' if alt is not None else f'{lon:.7f},{lat:.7f}\n')
+            for timestamp, lat, lon, alt in rows
+            if lat is not None and lon is not None
+        )
+    
+    yield '</coordinates></LineString></Placemark>\n</Document></kml>\n'
+
+# format: (content type, file extension, encoder, fixed fields or None if selectable)
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv', export_csv, None),
+    'ndjson': ('application/x-ndjson', 'ndjson', export_ndjson, None),
+    'gpx': ('application/gpx+xml', 'gpx', export_gpx, TRACK_FIELDS),
+    'kml': ('application/vnd.google-earth.kml+xml', 'kml', export_kml, TRACK_FIELDS)
+}
+
+def export_session(db: DatabaseManager, session_id: int, export_format: str, fields: List[str],
+                   start: Optional[float] = None, end: Optional[float] = None):
+    """Yield one session's telemetry encoded in the given format as bytes"""
+    encoder = EXPORT_FORMATS[export_format][2]
+    rows = db.iter_telemetry(session_id, fields, start, end, CONFIG['export']['chunk_size'])
+    try:
+        for chunk in encoder(session_id, fields, rows):
+            yield chunk.encode('utf-8')
+    finally:
+        rows.close()
+
+class ZipChunkBuffer(io.RawIOBase):
+    """Write-only, non-seekable sink that hands zip output back in chunks"""
+    
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+    
+    def writable(self):
+        return True
+    
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+    
+    def drain(self) -> bytes:
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+def export_sessions_zip(db: DatabaseManager, session_ids: List[int], export_format: str,
+                        fields: List[str], start: Optional[float] = None, end: Optional[float] = None):
+    """Yield a zip archive with one export file per session as bytes"""
+    extension = EXPORT_FORMATS[export_format][1]
+    buffer = ZipChunkBuffer()
+    
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for session_id in session_ids:
+            info = zipfile.ZipInfo(f'flight_{session_id}.{extension}', time.localtime()[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            # Sizes are unknown up front, so always reserve zip64 headers
+            with archive.open(info, 'w', force_zip64=True) as member:
+                for chunk in export_session(db, session_id, export_format, fields, start, end):
+                    member.write(chunk)
+                    yield buffer.drain()
+    
+    yield buffer.drain()
+
 # HTTP API handlers
+def etag_matches(request, etag: str) -> bool:
+    """Check the request's If-None-Match header against an ETag"""
+    if_none_match = request.headers.get('If-None-Match')
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(',')]
+    return '*' in tags or etag in tags or f'W/{etag}' in tags
+
+def cached_json_response(request, etag: str, body: bytes):
+    """Send a pre-encoded JSON body, or 304 if the client already has it"""
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+    if etag_matches(request, etag):
+        return web.Response(status=304, headers=headers)
+    return web.Response(body=body, content_type='application/json', headers=headers)
+
 async def get_telemetry(request):
-    """Get current telemetry data"""
+    """Get current telemetry data
+    
+    Supports If-None-Match, and long-polling with ?since=<seq>[&timeout=<s>]
+    which waits for a newer frame and answers 204 if none arrives in time
+    (304 if the request's If-None-Match already names the current frame).
+    """
     drone_controller = request.app['drone_controller']
-    telemetry_dict = asdict(drone_controller.current_telemetry)
     
-    return web.json_response({
-        'telemetry': telemetry_dict,
-        'status': drone_controller.status.value,
-        'session_id': drone_controller.current_session_id
-    })
+    since = request.query.get('since')
+    if since is not None:
+        try:
+            since = int(since)
+            timeout = float(request.query.get('timeout', CONFIG['server']['long_poll_timeout']))
+        except ValueError:
+            return web.json_response({
+                'success': False,
+                'message': 'since and timeout must be numbers'
+            }, status=400)
+        
+        timeout = max(0.0, min(timeout, CONFIG['server']['long_poll_timeout']))
+        if not await drone_controller.wait_for_telemetry(since, timeout):
+            _, etag, _ = drone_controller.get_telemetry_frame()
+            status = 304 if etag_matches(request, etag) else 204
+            return web.Response(status=status, headers={'ETag': etag, 'Cache-Control': 'no-cache'})
+    
+    _, etag, body = drone_controller.get_telemetry_frame()
+    return cached_json_response(request, etag, body)
 
 async def post_command(request):
     """Handle command via HTTP POST"""
@@ -564,14 +1253,148 @@ async def post_command(request):
 async def get_flight_history(request):
     """Get flight history from database"""
     drone_controller = request.app['drone_controller']
-    sessions = drone_controller.db.get_flight_history()
-    return web.json_response({'flights': sessions})
+    etag, body = await drone_controller.get_flight_history()
+    return cached_json_response(request, etag, body)
+
+async def get_heatmap_tile(request):
+    """Get an aggregated heatmap tile of historical positions"""
+    heatmap = request.app['drone_controller'].heatmap
+    if heatmap is None:
+        return web.json_response({
+            'success': False,
+            'message': 'Heatmap requires numpy'
+        }, status=503)
+    
+    z = int(request.match_info['z'])
+    x = int(request.match_info['x'])
+    y = int(request.match_info['y'])
+    if z > heatmap.cell_zoom or x >= (1 << z) or y >= (1 << z):
+        return web.json_response({
+            'success': False,
+            'message': f'Tile out of range (max zoom {heatmap.cell_zoom})'
+        }, status=404)
+    
+    etag, body = await heatmap.get_tile(z, x, y)
+    return cached_json_response(request, etag, body)
+
+def parse_export_options(request) -> Tuple[str, List[str], Optional[float], Optional[float]]:
+    """Read format, fields and time range from export query parameters"""
+    export_format = request.query.get('format', 'csv').lower()
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported format: {export_format}")
+    
+    fields = EXPORT_FORMATS[export_format][3]
+    if fields is None:
+        requested = request.query.get('fields')
+        fields = ([field.strip() for field in requested.split(',') if field.strip()]
+                  if requested else DatabaseManager.TELEMETRY_FIELDS)
+        unknown = [field for field in fields if field not in DatabaseManager.TELEMETRY_FIELDS]
+        if unknown or not fields:
+            raise ValueError(f"Unknown telemetry fields: {', '.join(unknown)}")
+    
+    try:
+        start = float(request.query['start']) if 'start' in request.query else None
+        end = float(request.query['end']) if 'end' in request.query else None
+    except ValueError:
+        raise ValueError("start and end must be unix timestamps")
+    
+    return export_format, fields, start, end
+
+async def stream_chunks(request, chunks, content_type: str, filename: str):
+    """Stream a blocking byte-chunk generator with chunked transfer encoding"""
+    response = web.StreamResponse(headers={
+        'Content-Type': content_type,
+        'Content-Disposition': f'attachment; filename="{filename}"'
+    })
+    response.enable_chunked_encoding()
+    await response.prepare(request)
+    
+    loop = asyncio.get_running_loop()
+    pending = None
+    try:
+        while True:
+            pending = loop.run_in_executor(None, next, chunks, None)
+            # Shielded so a cancelled handler still sees whether next() is running
+            chunk = await asyncio.shield(pending)
+            if chunk is None:
+                break
+            if chunk:
+                await response.write(chunk)
+    finally:
+        # After a cancel next() may still be running in its worker thread, and
+        # the generator can only be closed (releasing SQLite) once it returns
+        if pending is not None and not pending.done():
+            def close_chunks(future):
+                if not future.cancelled():
+                    future.exception()
+                chunks.close()
+            pending.add_done_callback(close_chunks)
+        else:
+            chunks.close()
+    
+    await response.write_eof()
+    return response
+
+async def export_flight(request):
+    """Stream a flight session's telemetry as CSV, NDJSON, GPX or KML"""
+    drone_controller = request.app['drone_controller']
+    session_id = int(request.match_info['session_id'])
+    
+    try:
+        export_format, fields, start, end = parse_export_options(request)
+    except ValueError as e:
+        return web.json_response({'success': False, 'message': str(e)}, status=400)
+    
+    loop = asyncio.get_running_loop()
+    if not await loop.run_in_executor(None, drone_controller.db.session_exists, session_id):
+        return web.json_response({
+            'success': False,
+            'message': f'Flight session {session_id} not found'
+        }, status=404)
+    
+    content_type, extension = EXPORT_FORMATS[export_format][:2]
+    chunks = export_session(drone_controller.db, session_id, export_format, fields, start, end)
+    return await stream_chunks(request, chunks, content_type, f'flight_{session_id}.{extension}')
+
+async def export_flights(request):
+    """Stream several flight sessions as a single zip archive (?ids=1,2,3)"""
+    drone_controller = request.app['drone_controller']
+    
+    try:
+        ids = request.query.get('ids', '')
+        session_ids = list(dict.fromkeys(int(value) for value in ids.split(',') if value.strip()))
+        export_format, fields, start, end = parse_export_options(request)
+    except ValueError as e:
+        return web.json_response({'success': False, 'message': str(e)}, status=400)
+    
+    max_sessions = CONFIG['export']['max_sessions']
+    if not session_ids or len(session_ids) > max_sessions:
+        return web.json_response({
+            'success': False,
+            'message': f'ids must list between 1 and {max_sessions} sessions'
+        }, status=400)
+    
+    loop = asyncio.get_running_loop()
+    missing = await loop.run_in_executor(None, drone_controller.db.missing_sessions, session_ids)
+    if missing:
+        return web.json_response({
+            'success': False,
+            'message': f"Flight sessions not found: {', '.join(map(str, missing))}"
+        }, status=404)
+    
+    chunks = export_sessions_zip(drone_controller.db, session_ids, export_format, fields, start, end)
+    return await stream_chunks(request, chunks, 'application/zip', 'flights.zip')
 
 async def get_health(request):
     """Health check endpoint"""
+    drone_controller = request.app['drone_controller']
     return web.json_response({
         'status': 'healthy',
-        'timestamp': time.time()
+        'timestamp': time.time(),
+        'logging': {
+            'dropped_records': log_queue_handler.dropped,
+            'dropped_flight_logs': drone_controller.db.dropped_flight_logs
+        }
     })
 
 async def serve_static(request):
@@ -601,6 +1424,9 @@ def create_app():
     app.router.add_get('/api/telemetry', get_telemetry)
     app.router.add_post('/api/command', post_command)
     app.router.add_get('/api/flights', get_flight_history)
+    app.router.add_get('/api/flights/export', export_flights)
+    app.router.add_get(r'/api/flights/{session_id:\d+}/export', export_flight)
+    app.router.add_get(r'/api/heatmap/{z:\d+}/{x:\d+}/{y:\d+}', get_heatmap_tile)
     app.router.add_get('/api/health', get_health)
     
     # Add CORS to all routes